@@ -1,19 +1,36 @@
 #!/usr/bin/env python3
 """
-Doorbot Client - RPi.GPIO version with static reverse time
+Doorbot Client - pigpio version with static reverse time
 """
-import RPi.GPIO as GPIO
+import pigpio
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
 import os
+import logging
 import random
-from datetime import datetime
+import threading
+import queue
+import wave
+
+try:
+    import alsaaudio
+    _PCM_FORMATS = {1: alsaaudio.PCM_FORMAT_U8, 2: alsaaudio.PCM_FORMAT_S16_LE,
+                    3: alsaaudio.PCM_FORMAT_S24_3LE, 4: alsaaudio.PCM_FORMAT_S32_LE}
+except ImportError:
+    alsaaudio = None  # Fall back to spawning aplay per sound
+    _PCM_FORMATS = {}
 
 API_KEY = os.getenv("YAKKO_API_KEY", "")
+AUTH_HEADERS = {"Authorization": f"Bearer {API_KEY}"}
 
 SERVER_URL = "http://yakko.cs.wmich.edu:8878"
-POLL_INTERVAL = 1.0
+POLL_INTERVAL = 1.0  # Minimum spacing between polls
+LONG_POLL_TIMEOUT = 30  # Seconds the server may hold a poll open
+CONNECT_TIMEOUT = 1  # Fail fast when the server is unreachable
+READ_GRACE = 3  # Extra seconds past LONG_POLL_TIMEOUT for the reply
 UNLOCK_HOLD_TIME = 10
 REVERSE_TIME = 6.5  # Static time to reverse motor
 
@@ -27,120 +44,258 @@ BUTTON_PIN = 7
 PWM_FREQUENCY = 500
 MOTOR_DUTY_CYCLE = 50
 
+# Limit switch
+SWITCH_TIMEOUT = 15  # Give up waiting for the switch after this many seconds
+SWITCH_GLITCH_US = 20000  # Level must be stable this long to count as an edge
+
 # Sound
 SOUNDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sounds')
+AUDIO_DEVICE = 'hw:0,0'
+AUDIO_PERIOD_FRAMES = 1024
+
+_switch_pressed = threading.Event()
+
+_sound_cache = {'mtime': 0, 'list': []}
+_sound_data = {}  # name -> (st_mtime_ns, (channels, sampwidth, rate, frames) or None)
+_sound_queue = queue.Queue()  # Frames to play, or None to just stop
+_pcm_idle = threading.Event()  # Set while the worker has no PCM open
+_pcm_idle.set()
+
+logger = logging.getLogger('doorbot')
+_level = logging.getLevelName(os.getenv("DOORBOT_LOG_LEVEL", "INFO").upper())
+logger.setLevel(_level if isinstance(_level, int) else logging.INFO)
+_handler = logging.StreamHandler()
+_handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+logger.addHandler(_handler)
 
-def get_timestamp():
-    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+# One pooled keep-alive connection for every request to the server
+SESSION = requests.Session()
+SESSION.headers.update(AUTH_HEADERS)
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2,
+                       max_retries=Retry(total=1, connect=1, read=False, backoff_factor=0))
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
 
 def setup_gpio():
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setwarnings(False)
-    GPIO.setup(RELAY_PIN, GPIO.OUT, initial=GPIO.LOW)
-    GPIO.setup(DIRECTION_PIN, GPIO.OUT, initial=GPIO.LOW)
-    GPIO.setup(PWM_PIN, GPIO.OUT)
-    GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-    pwm = GPIO.PWM(PWM_PIN, PWM_FREQUENCY)
-    print(f"[{get_timestamp()}] GPIO initialized")
-    return pwm
+    pi = pigpio.pi()  # Connects to the local pigpiod daemon
+    if not pi.connected:
+        raise RuntimeError("Cannot connect to pigpiod (is the service running?)")
+    for pin in (RELAY_PIN, DIRECTION_PIN, PWM_PIN):
+        pi.set_mode(pin, pigpio.OUTPUT)
+        pi.write(pin, 0)
+    pi.set_PWM_frequency(PWM_PIN, PWM_FREQUENCY)
+    pi.set_PWM_range(PWM_PIN, 100)  # Duty cycle in percent
+    pi.set_mode(BUTTON_PIN, pigpio.INPUT)
+    pi.set_pull_up_down(BUTTON_PIN, pigpio.PUD_UP)
+    pi.set_glitch_filter(BUTTON_PIN, SWITCH_GLITCH_US)
+    pi.callback(BUTTON_PIN, pigpio.FALLING_EDGE, lambda gpio, level, tick: _switch_pressed.set())
+    logger.info("GPIO initialized")
+    return pi
+
+def motor_start(pi):
+    pi.set_PWM_dutycycle(PWM_PIN, MOTOR_DUTY_CYCLE)
+
+def motor_stop(pi):
+    pi.set_PWM_dutycycle(PWM_PIN, 0)
 
 def poll_server():
     try:
-        response = requests.get(SERVER_URL, headers={"Authorization": "Bearer " + API_KEY}, timeout=5)
+        # Long poll: the server holds the request until letmein is set or
+        # `wait` seconds pass. Servers that ignore `wait` answer right
+        # away and main() falls back to POLL_INTERVAL spacing.
+        response = SESSION.get(SERVER_URL, params={"wait": LONG_POLL_TIMEOUT},
+                               timeout=(CONNECT_TIMEOUT, LONG_POLL_TIMEOUT + READ_GRACE))
         response.raise_for_status()
         return response.json()
-    except:
+    except Exception as e:
+        logger.warning("Poll failed: %s", type(e).__name__)
         return None
 
+def get_sound_list():
+    # Only rescan the directory when its mtime changes (files added/removed
+    # or replaced by rename, which is how rclone updates a file)
+    mtime = os.stat(SOUNDS_DIR).st_mtime_ns
+    if mtime != _sound_cache['mtime']:
+        with os.scandir(SOUNDS_DIR) as entries:
+            mtimes = {e.name: e.stat().st_mtime_ns for e in entries
+                      if e.name.endswith('.wav') and e.is_file()}
+        _sound_cache['list'] = list(mtimes)
+        _sound_cache['mtime'] = mtime
+        # Drop preloaded audio for files that are gone or were replaced
+        for name, (loaded_mtime, _) in list(_sound_data.items()):
+            if mtimes.get(name) != loaded_mtime:
+                del _sound_data[name]
+    return _sound_cache['list']
+
+def load_sound(name):
+    # Returns None (and remembers it) for files ALSA can't be fed directly;
+    # play_sound() hands those to aplay instead
+    path = os.path.join(SOUNDS_DIR, name)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError as e:
+        logger.error("Sound preload error: %s", e)
+        return None
+    try:
+        with wave.open(path, 'rb') as w:
+            if w.getsampwidth() not in _PCM_FORMATS:
+                raise ValueError(f"unsupported sample width {w.getsampwidth()}")
+            data = (w.getnchannels(), w.getsampwidth(), w.getframerate(),
+                    w.readframes(w.getnframes()))
+    except Exception as e:
+        logger.warning("Cannot preload %s, will use aplay: %r", name, e)
+        data = None
+    _sound_data[name] = (mtime, data)
+    return data
+
+def _open_pcm(channels, sampwidth, rate):
+    pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, alsaaudio.PCM_NORMAL, device=AUDIO_DEVICE)
+    pcm.setchannels(channels)
+    pcm.setrate(rate)
+    pcm.setformat(_PCM_FORMATS[sampwidth])
+    pcm.setperiodsize(AUDIO_PERIOD_FRAMES)
+    return pcm
+
+def _playback_worker():
+    # The PCM is only held while a sound plays: a raw hw: device can't be
+    # shared, and aplay needs it for files that couldn't be preloaded
+    while True:
+        item = _sound_queue.get()
+        if item is None:
+            continue  # Stop request; the device is already released
+        channels, sampwidth, rate, frames = item
+        _pcm_idle.clear()
+        pcm = None
+        try:
+            pcm = _open_pcm(channels, sampwidth, rate)
+            chunk = AUDIO_PERIOD_FRAMES * channels * sampwidth
+            silence = b'\x80' if sampwidth == 1 else b'\0'  # U8 is unsigned
+            for i in range(0, len(frames), chunk):
+                if not _sound_queue.empty():
+                    break  # A newer sound (or a stop) replaces this one
+                pcm.write(frames[i:i + chunk].ljust(chunk, silence))
+        except Exception as e:
+            logger.error("Sound error: %s", e)
+        finally:
+            if pcm is not None:
+                pcm.close()
+            _pcm_idle.set()
+
+def setup_audio():
+    if alsaaudio is None:
+        logger.info("alsaaudio not installed, using aplay")
+        return
+    try:
+        names = get_sound_list()
+    except OSError as e:
+        logger.error("Sound preload error: %s", e)
+        names = []
+    for name in names:
+        load_sound(name)
+    threading.Thread(target=_playback_worker, daemon=True).start()
+    loaded = sum(1 for _, data in _sound_data.values() if data is not None)
+    logger.info("Audio initialized (%d sounds)", loaded)
+
 def play_sound():
     try:
-        wavs = [f for f in os.listdir(SOUNDS_DIR) if f.endswith('.wav')]
+        wavs = get_sound_list()
         if not wavs:
-            print(f"[{get_timestamp()}] No .wav files in {SOUNDS_DIR}")
+            logger.warning("No .wav files in %s", SOUNDS_DIR)
             return
-        pick = random.choice(wavs)
-        path = os.path.join(SOUNDS_DIR, pick)
-        subprocess.Popen(['aplay', '-D', 'hw:0,0', path])
-        print(f"[{get_timestamp()}] Playing {pick}")
+        pick = wavs[random.randrange(len(wavs))]
+        data = None
+        if alsaaudio is not None:
+            cached = _sound_data.get(pick)
+            data = cached[1] if cached else load_sound(pick)
+        if data is None:
+            if alsaaudio is not None:
+                # Make the worker let go of the device before aplay opens it
+                _sound_queue.put(None)
+                _pcm_idle.wait(1)
+            subprocess.Popen(['aplay', '-D', AUDIO_DEVICE, os.path.join(SOUNDS_DIR, pick)])
+        else:
+            _sound_queue.put(data)
+        logger.info("Playing %s", pick)
     except Exception as e:
-        print(f"[{get_timestamp()}] Sound error: {e}")
+        logger.error("Sound error: %s", e)
 
-def unlock_door(pwm):
-    print(f"\n{'='*60}")
-    print(f"[{get_timestamp()}] UNLOCKING DOOR")
-    print(f"{'='*60}")
+def unlock_door(pi):
+    logger.info("UNLOCKING DOOR")
     
     try:
         # Power on relay
-        print(f"[{get_timestamp()}] Activating relay...")
-        GPIO.output(RELAY_PIN, GPIO.HIGH)
+        logger.info("Activating relay...")
+        pi.write(RELAY_PIN, 1)
         time.sleep(0.5)
         
         # Set direction to unlock and start motor
-        print(f"[{get_timestamp()}] Starting motor (unlock)...")
-        GPIO.output(DIRECTION_PIN, GPIO.HIGH)
-        pwm.start(MOTOR_DUTY_CYCLE)
-        
-        # Wait until limit switch triggers
-        timeout = 15
-        start_time = time.time()
+        logger.info("Starting motor (unlock)...")
+        _switch_pressed.clear()
+        pi.write(DIRECTION_PIN, 1)
+        motor_start(pi)
         
-        while GPIO.input(BUTTON_PIN) == GPIO.HIGH:  # HIGH = not pressed
-            if time.time() - start_time > timeout:
-                print(f"[{get_timestamp()}] TIMEOUT!")
-                break
-            time.sleep(0.1)
+        # Block until the limit switch callback fires (HIGH = not pressed).
+        # Detection is armed before the motor starts, so an edge between
+        # the input check and the wait is not lost.
+        if pi.read(BUTTON_PIN) == 1:
+            if not _switch_pressed.wait(SWITCH_TIMEOUT):
+                logger.warning("TIMEOUT waiting for limit switch!")
         
-        pwm.stop()
-        print(f"[{get_timestamp()}] Unlocked!")
+        motor_stop(pi)
+        logger.info("Unlocked!")
         play_sound()
         
         # Hold door open
-        print(f"[{get_timestamp()}] Holding for {UNLOCK_HOLD_TIME}s...")
+        logger.info("Holding for %ss...", UNLOCK_HOLD_TIME)
         time.sleep(UNLOCK_HOLD_TIME)
         
         # Reverse for static time
-        print(f"[{get_timestamp()}] Reversing for {REVERSE_TIME}s...")
-        GPIO.output(DIRECTION_PIN, GPIO.LOW)
-        pwm.start(MOTOR_DUTY_CYCLE)
+        logger.info("Reversing for %ss...", REVERSE_TIME)
+        pi.write(DIRECTION_PIN, 0)
+        motor_start(pi)
         time.sleep(REVERSE_TIME)
-        pwm.stop()
+        motor_stop(pi)
         
         # Power off
-        print(f"[{get_timestamp()}] Relay off")
-        GPIO.output(RELAY_PIN, GPIO.LOW)
-        print(f"[{get_timestamp()}] Done")
-        print(f"{'='*60}\n")
+        logger.info("Relay off")
+        pi.write(RELAY_PIN, 0)
+        logger.info("Done")
         
     except Exception as e:
-        print(f"[{get_timestamp()}] ERROR: {e}")
-        pwm.stop()
-        GPIO.output(RELAY_PIN, GPIO.LOW)
+        logger.error("ERROR: %s", e)
+        motor_stop(pi)
+        pi.write(RELAY_PIN, 0)
 
 def main():
-    print(f"\nDOORBOT CLIENT - {SERVER_URL}")
-    pwm = setup_gpio()
+    logger.info("DOORBOT CLIENT - %s", SERVER_URL)
+    pi = setup_gpio()
+    setup_audio()
     consecutive_errors = 0
     
     try:
         while True:
+            poll_start = time.monotonic()
             status = poll_server()
             if status is None:
                 consecutive_errors += 1
                 if consecutive_errors >= 10:
-                    print("Too many errors")
+                    logger.error("Too many errors")
                     break
             else:
                 consecutive_errors = 0
                 if status.get('letmein', False):
-                    unlock_door(pwm)
-            time.sleep(POLL_INTERVAL)
+                    unlock_door(pi)
+                    continue
+            elapsed = time.monotonic() - poll_start
+            if elapsed < POLL_INTERVAL:
+                time.sleep(POLL_INTERVAL - elapsed)
     except KeyboardInterrupt:
-        print("Shutdown")
+        logger.info("Shutdown")
     finally:
-        pwm.stop()
-        GPIO.output(RELAY_PIN, GPIO.LOW)
-        GPIO.cleanup()
+        motor_stop(pi)
+        pi.write(RELAY_PIN, 0)
+        pi.stop()
+        SESSION.close()
 
 if __name__ == '__main__':
     main()